@@ -4,42 +4,133 @@
 # Example (two peers):
 # python client.py Joel 9101 127.0.0.1 9000 127.0.0.1 9102 Alice 127.0.0.1 9103 Bob
 
+import os
 import sys
+import selectors
 import socket
 import json
 import threading
+import time
 from datetime import datetime
-from dme import LamportDME
+from dme import LamportDME, _mk_tcp_sock, _send_framed, _recv_framed
+
+# VIEW is a constant request — encode it once. Rapid repeated views are
+# served from a short-lived cache instead of hammering the server.
+_VIEW_REQ = b'{"action": "VIEW"}'
+_VIEW_TTL = 0.2  # seconds
+_view_cache = (0.0, None)  # (fetch time, content)
 
 def send_server_view(server_host, server_port):
-    req = {"action":"VIEW"}
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    global _view_cache
+    fetched, content = _view_cache
+    if content is not None and time.time() - fetched < _VIEW_TTL:
+        return content
+    s = _mk_tcp_sock()
     s.connect((server_host, server_port))
-    s.sendall(json.dumps(req).encode())
-    data = s.recv(65536).decode()
+    _send_framed(s, _VIEW_REQ)
+    resp = _recv_framed(s)
     s.close()
-    resp = json.loads(data)
+    if resp is None:
+        raise Exception("server closed connection")
     if resp.get("status") == "OK":
-        return resp.get("content")
+        content = resp.get("content")
+        _view_cache = (time.time(), content)
+        return content
     else:
         raise Exception(resp.get("message","unknown"))
 
 def send_server_post(server_host, server_port, user_id, text, client_ts):
+    global _view_cache
     req = {"action":"POST", "user_id": user_id, "text": text, "client_ts": client_ts}
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s = _mk_tcp_sock()
     s.connect((server_host, server_port))
-    s.sendall(json.dumps(req).encode())
-    data = s.recv(65536).decode()
+    _send_framed(s, json.dumps(req).encode())
+    resp = _recv_framed(s)
     s.close()
-    return json.loads(data)
+    if resp is None:
+        raise Exception("server closed connection")
+    if resp.get("status") == "OK":
+        # our own post made the cached view stale — drop it so the next
+        # view re-fetches and includes the line we just wrote
+        _view_cache = (0.0, None)
+    return resp
+
+# Upper bound on how many piled-up posts share one critical section
+MAX_POST_BATCH = 8
+
+def _drain_pending_posts(pending_lines, limit):
+    # Collect further 'post ' lines already read off stdin (e.g. a pasted
+    # block) so they can share one critical-section acquisition. A paste
+    # lands in the line queue in full on the first read, so draining the
+    # queue — not the fd, which is empty by then — is what catches it.
+    # Returns the batched texts plus the first non-post line consumed, if
+    # any, for the caller to handle.
+    texts = []
+    leftover = None
+    while pending_lines and len(texts) < limit:
+        line = pending_lines.pop(0).strip()
+        if not line:
+            continue
+        if line.lower().startswith("post "):
+            texts.append(line[5:].strip())
+        else:
+            leftover = line
+            break
+    return texts, leftover
 
 def cli_loop(my_id, dme, server_host, server_port):
     print(f"[{my_id}] Enter commands: view  OR  post <text>   (type 'exit' to quit)")
+    pending_cmd = None
+    # stdin goes through a selector so the main thread can run DME
+    # housekeeping (dme.tick) while the user is idle instead of sitting
+    # blocked in input(). Input is read from the raw fd and split into
+    # lines here: readline() would pull every byte available into
+    # Python's buffered layer, where select() — which only sees the
+    # kernel buffer — could never find pasted/typed-ahead lines again.
+    sel = selectors.DefaultSelector()
+    try:
+        sel.register(sys.stdin, selectors.EVENT_READ)
+        stdin_selectable = True
+    except (ValueError, OSError):
+        stdin_selectable = False
+    pending_lines = []  # complete lines already read off the fd
+    partial = b""       # trailing bytes of a not-yet-complete line
+    eof = False
     while True:
-        try:
-            line = input(f"{my_id}> ").strip()
-        except EOFError:
-            break
+        if pending_cmd is not None:
+            line, pending_cmd = pending_cmd, None
+        elif pending_lines:
+            line = pending_lines.pop(0).strip()
+        else:
+            if eof:
+                break
+            sys.stdout.write(f"{my_id}> ")
+            sys.stdout.flush()
+            if stdin_selectable:
+                while b"\n" not in partial:
+                    if not sel.select(timeout=1.0):
+                        dme.tick()
+                        continue
+                    data = os.read(sys.stdin.fileno(), 65536)
+                    if not data:
+                        eof = True
+                        break
+                    partial += data
+                lines = partial.split(b"\n")
+                partial = lines.pop()
+                pending_lines.extend(l.decode() for l in lines)
+                if eof and partial:
+                    # final line arrived without a trailing newline
+                    pending_lines.append(partial.decode())
+                    partial = b""
+                if not pending_lines:
+                    break  # EOF with nothing left to run
+                line = pending_lines.pop(0).strip()
+            else:
+                line = sys.stdin.readline()
+                if not line:
+                    break  # EOF
+                line = line.strip()
         if not line:
             continue
         if line.lower() == "exit":
@@ -50,20 +141,30 @@ def cli_loop(my_id, dme, server_host, server_port):
             print(content if content.strip() else "(empty)")
             print("========================")
         elif line.lower().startswith("post "):
-            txt = line[5:].strip()
+            texts = [line[5:].strip()]
+            # batch any posts already queued up on stdin under one acquire,
+            # amortizing the DME broadcast across all of them
+            more, pending_cmd = _drain_pending_posts(pending_lines, MAX_POST_BATCH - 1)
+            texts.extend(more)
             # Acquire DME
-            print("[DME] Requesting critical section...")
+            print(f"[DME] Requesting critical section... ({len(texts)} post(s))")
             ts = dme.request_critical_section()
-            # create client timestamp for the post
-            client_ts = datetime.now().strftime("%d %b %I:%M:%S%p")
-            print(f"[DME] Entered critical section (ts={ts}). Posting to server...")
-            resp = send_server_post(server_host, server_port, my_id, txt, client_ts)
-            print("[SERVER] Response:", resp)
+            # collect the output and flush it in one write: one stdout lock
+            # acquisition and one syscall instead of one per line, which
+            # matters when posts are scripted
+            out = [f"[DME] Entered critical section (ts={ts}). Posting to server...\n"]
+            for txt in texts:
+                # create client timestamp for the post
+                client_ts = datetime.now().strftime("%d %b %I:%M:%S%p")
+                resp = send_server_post(server_host, server_port, my_id, txt, client_ts)
+                out.append(f"[SERVER] Response: {resp}\n")
             # release
             dme.release_critical_section(ts)
-            print("[DME] Released critical section.")
+            out.append("[DME] Released critical section.\n")
+            sys.stdout.write("".join(out))
         else:
             print("Unknown command. Use 'view' or 'post <text>' or 'exit'")
+    sel.close()
 
 if __name__ == "__main__":
     if len(sys.argv) < 8 or (len(sys.argv)-5) % 3 != 0:
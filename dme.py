@@ -9,181 +9,574 @@
 # - request_critical_section() -> blocks until allowed
 # - release_critical_section()
 
+import concurrent.futures
+import heapq
+import os
+import selectors
 import socket
+import struct
 import threading
 import json
 import time
-from queue import PriorityQueue
+
+def _mk_tcp_sock():
+    # All DME/client messages are tiny; disable Nagle so they go out
+    # immediately instead of waiting on delayed ACKs.
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return s
+
+def _recv_exact(sock, n):
+    # recv() may return fewer bytes than asked — loop until we have n,
+    # or None if the peer closed the connection.
+    buf = b''
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return buf
+
+# Fixed-schema binary control messages. Every DME message is one of four
+# types carrying at most a timestamp, an auxiliary timestamp and two node
+# ids, so JSON (a dict build plus UTF-8 walk per message) is overkill.
+# Wire layout after the length prefix: 1-byte type, 4-byte timestamp,
+# 4-byte aux timestamp, two 2-byte id lengths, then the id bytes.
+# Unused fields are zero/empty:
+# - REQUEST: timestamp, node id
+# - REPLY:   timestamp, node id; (aux_ts, aux_id) carries the replier's
+#            own pending request when it has one
+# - RELEASE: timestamp, node id; aux_ts is the timestamp the released
+#            request was queued under
+# - PING/PONG carry no fields: they only probe whether a peer is alive
+_T_REQUEST, _T_REPLY, _T_RELEASE, _T_ACK, _T_PING, _T_PONG = 1, 2, 3, 4, 5, 6
+
+# Number of reactor threads; each binds its own listen socket to the same
+# port with SO_REUSEPORT so the kernel spreads incoming connections over
+# them without any user-space dispatch.
+_N_LISTENERS = 2
+_HDR = struct.Struct('>BIIHH')
+
+def _pack_msg(typ, ts=0, aux_ts=0, nid='', aux_id=''):
+    nid_b = nid.encode()
+    aux_b = aux_id.encode()
+    return _HDR.pack(typ, ts, aux_ts, len(nid_b), len(aux_b)) + nid_b + aux_b
+
+def _unpack_msg(payload):
+    typ, ts, aux_ts, n1, n2 = _HDR.unpack_from(payload)
+    off = _HDR.size
+    nid = payload[off:off + n1].decode()
+    aux_id = payload[off + n1:off + n1 + n2].decode()
+    return typ, ts, aux_ts, nid, aux_id
+
+# JSON stays on the human-facing server protocol (VIEW/POST); the client
+# imports these helpers for it.
+_DEC = json.JSONDecoder()
+
+_HAS_SENDMSG = hasattr(socket.socket, 'sendmsg')
+
+def _send_framed(sock, payload):
+    # 4-byte big-endian length prefix so multiple messages can share one
+    # stream. Header and body always leave in a single syscall so they
+    # land in one TCP segment; sendmsg gathers the two buffers without
+    # first copying them into a third.
+    header = struct.pack('>I', len(payload))
+    if _HAS_SENDMSG:
+        sent = sock.sendmsg([header, payload])
+        if sent < 4 + len(payload):
+            # partial gather write (tiny frames make this rare) — finish it
+            sock.sendall((header + payload)[sent:])
+    else:
+        sock.sendall(header + payload)
+
+def _recv_framed_raw(sock):
+    header = _recv_exact(sock, 4)
+    if header is None:
+        return None
+    (length,) = struct.unpack('>I', header)
+    return _recv_exact(sock, length)
+
+def _recv_framed(sock):
+    payload = _recv_framed_raw(sock)
+    if payload is None:
+        return None
+    return _DEC.decode(payload.decode())
+
+def _drain_frames(buf):
+    # Slice every complete length-prefixed frame out of the buffer,
+    # leaving any trailing partial frame in place.
+    payloads = []
+    while len(buf) >= 4:
+        (length,) = struct.unpack('>I', bytes(buf[:4]))
+        if len(buf) < 4 + length:
+            break
+        payloads.append(bytes(buf[4:4 + length]))
+        del buf[:4 + length]
+    return payloads
 
 class LamportDME:
     def __init__(self, my_id, my_port, peers):
         self.my_id = my_id
         self.my_port = my_port
         self.peers = peers  # list of dicts: {"host":..., "port":..., "id":...}
-        self.clock = 0
         self.lock = threading.Lock()
 
-        # Replies management
+        # Lamport clock under its own tiny lock: max-then-increment is two
+        # ALU ops, and giving it a dedicated lock keeps clock arithmetic on
+        # every send/receive from contending with reply accounting and
+        # queue updates under self.lock.
+        self.clock = 0
+        self._clock_lock = threading.Lock()
+
+        # Replies management. The condition shares self.lock: the listener
+        # notifies it whenever replies_needed shrinks or the queue head may
+        # have changed, so the acquirer never has to poll.
         self.replies_needed = set()
-        self.replies_event = threading.Event()
+        self.cv = threading.Condition(self.lock)
+
+        # Request queue: heap of (timestamp, id) guarded by self.lock.
+        # Removal is lazy — tombstoned pairs go into _removed and are
+        # popped off the heap the next time someone peeks at the head.
+        # _queued dedupes direct REQUESTs against piggybacked copies and
+        # _last_removed keeps an already-released request from being
+        # re-queued by a late piggyback.
+        self._heap = []
+        self._removed = set()
+        self._queued = set()
+        self._last_removed = {}
+
+        # Cache of the live queue head, refreshed by every writer under
+        # self.lock. Readers get the head with one tuple read (atomic in
+        # CPython) instead of walking tombstones off the heap.
+        self._head_cache = None
+
+        # Our own outstanding request, piggybacked on every REPLY we send.
+        # REQUEST and REPLY between two nodes travel on different sockets,
+        # so without this a peer can learn of our REPLY before our earlier
+        # REQUEST and enter the critical section alongside us.
+        self._my_req = None
+
+        # One long-lived connection per peer, reused across messages so each
+        # critical section doesn't pay 2*N TCP handshakes
+        self.peer_conns = {p["id"]: None for p in peers}
+        self.peer_locks = {p["id"]: threading.Lock() for p in peers}
+
+        # Per-peer health: smoothed round-trip time (seeded optimistically)
+        # drives the acquire wait timeout, and a peer that fails two PINGs
+        # in a row is declared down instead of stalling everyone for 10 s.
+        # RTTs are measured from broadcast/probe send times to the arrival
+        # of the matching REPLY/PONG in the reactor.
+        self._rtt_ewma = {p["id"]: 0.01 for p in peers}
+        self._ping_fails = {}
+        self._req_sent = {}
+        self._ping_sent = {}
+        self._pong_seen = set()
+
+        # Outbound sockets are read by the reactor too (REPLYs and PONGs
+        # arrive asynchronously); the wake-up pair lets sender threads hand
+        # a new connection to the reactor without waiting out its select.
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._pending_reg = []
 
-        # Request queue: items are (timestamp, id)
-        self.request_queue = PriorityQueue()
+        # Pool for broadcasting to all peers concurrently, so a broadcast
+        # costs max(RTT) rather than the sum over peers
+        self._bcast_pool = concurrent.futures.ThreadPoolExecutor(max_workers=max(4, len(peers)))
 
-        # Start listener for incoming DME messages
+        # Start listeners for incoming DME messages. With SO_REUSEPORT the
+        # kernel load-balances peer connections across the reactors, so
+        # accepting one connection never delays traffic on another; reactor
+        # 0 additionally owns the wake-up pipe and the outbound sockets.
         self.running = True
-        t = threading.Thread(target=self._listener, daemon=True)
-        t.start()
+        n = _N_LISTENERS if hasattr(socket, 'SO_REUSEPORT') else 1
+        for i in range(n):
+            t = threading.Thread(target=self._listener, args=(i,), daemon=True)
+            t.start()
 
     def _increment_clock(self, other_ts=None):
-        with self.lock:
+        with self._clock_lock:
             if other_ts is None:
                 self.clock += 1
             else:
                 self.clock = max(self.clock, other_ts) + 1
             return self.clock
 
-    def _listener(self):
+    def _listener(self, idx=0):
+        # Optional: pin the reactor to one core (env DME_CPU) so wakeups on
+        # the latency-sensitive acquire path don't migrate across CPUs and
+        # pay cold-cache/IPI costs. Pair with NIC IRQ affinity (see README).
+        core = os.environ.get('DME_CPU')
+        if core is not None and hasattr(os, 'sched_setaffinity'):
+            try:
+                os.sched_setaffinity(0, {int(core)})
+            except (ValueError, OSError) as e:
+                print(f"[DME] Could not pin reactor to CPU {core}: {e}")
         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         s.bind(('0.0.0.0', self.my_port))
         s.listen(5)
+        # Event-driven reactor: one selector multiplexes the listen socket
+        # and every peer connection, so handling one peer's REQUEST never
+        # blocks another peer's REPLY — and no thread per connection.
+        sel = selectors.DefaultSelector()
+        sel.register(s, selectors.EVENT_READ)
+        if idx == 0:
+            sel.register(self._wake_r, selectors.EVENT_READ)
+        buffers = {}  # conn -> bytearray of not-yet-parsed inbound bytes
         while self.running:
-            try:
-                conn, addr = s.accept()
-                data = conn.recv(65536).decode()
-                if not data:
-                    conn.close()
-                    continue
-                msg = json.loads(data)
-                typ = msg.get("type")
-                if typ == "REQUEST":
-                    ts = msg["timestamp"]
-                    nid = msg["node_id"]
-                    # update clock
-                    self._increment_clock(ts)
-                    # enqueue request
-                    self.request_queue.put((ts, nid))
-                    # send REPLY
-                    reply = {"type":"REPLY", "timestamp": self._increment_clock(), "node_id": self.my_id}
-                    conn.sendall(json.dumps(reply).encode())
-                elif typ == "RELEASE":
-                    ts = msg["timestamp"]
-                    nid = msg["node_id"]
-                    # update clock
-                    self._increment_clock(ts)
-                    # remove from queue: reconstruct queue without the released request
-                    self._remove_request(nid, ts)
-                    conn.sendall(json.dumps({"type":"ACK"}).encode())
-                elif typ == "REPLY":
-                    ts = msg["timestamp"]
-                    nid = msg["node_id"]
-                    self._increment_clock(ts)
-                    # mark reply received
-                    with self.lock:
-                        if nid in self.replies_needed:
-                            self.replies_needed.remove(nid)
-                            if not self.replies_needed:
-                                self.replies_event.set()
-                    conn.sendall(json.dumps({"type":"ACK"}).encode())
-                else:
-                    conn.sendall(json.dumps({"status":"ERR", "message":"unknown type"}).encode())
-                conn.close()
-            except Exception as e:
-                # continue listening
-                continue
+            for key, _ in sel.select(timeout=0.5):
+                # one bad event must never take the reactor down — losing
+                # reactor 0 would also lose the wake pipe and every
+                # outbound socket's inbound traffic
+                try:
+                    if key.fileobj is s:
+                        self._on_accept(s, sel, buffers)
+                    elif key.fileobj is self._wake_r:
+                        self._on_wakeup(sel, buffers)
+                    else:
+                        self._on_readable(key.fileobj, sel, buffers)
+                except Exception as e:
+                    print(f"[DME] Reactor error (ignored): {e}")
+        for conn in list(buffers):
+            conn.close()
+        sel.close()
         s.close()
+        if idx == 0:
+            self._wake_r.close()
+            self._wake_w.close()
 
-    def _remove_request(self, nid, ts):
-        # PriorityQueue doesn't allow direct removal — rebuild
-        items = []
-        while not self.request_queue.empty():
-            items.append(self.request_queue.get())
-        # remove matching
-        items = [it for it in items if it[1] != nid]
-        for it in items:
-            self.request_queue.put(it)
-        print(f"[DME] Queue after removing {nid}: {list(self.request_queue.queue)}")
-
-    def _send_to_peer(self, peer, msg, expect_response=False, timeout=5):
+    def _register_outbound(self, conn):
+        # called from sender threads: queue the socket and poke the reactor
+        with self.lock:
+            self._pending_reg.append(conn)
         try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.settimeout(timeout)
-            s.connect((peer["host"], peer["port"]))
-            s.sendall(json.dumps(msg).encode())
-            if expect_response:
-                data = s.recv(65536).decode()
-                if data:
-                    return json.loads(data)
-            s.close()
-        except Exception as e:
-            # network error or peer down; if peer is down then we treat as non-responsive
-            print(f"[DME] Failed to contact peer {peer['id']}: {e}")
-            with self.lock:
-                self.replies_needed.discard(peer["id"])
+            self._wake_w.send(b'\x00')
+        except OSError:
+            pass
 
-            return None
-        return None
+    def _on_wakeup(self, sel, buffers):
+        try:
+            self._wake_r.recv(4096)
+        except BlockingIOError:
+            pass
+        with self.lock:
+            pending, self._pending_reg = self._pending_reg, []
+        for conn in pending:
+            try:
+                self._sel_register(sel, conn, buffers)
+            except (OSError, ValueError):
+                buffers.pop(conn, None)
+
+    def _sel_register(self, sel, conn, buffers):
+        # Sockets closed elsewhere (e.g. _drop_peer_conn on a send failure)
+        # vanish from epoll but stay in the selector's own fd map, and the
+        # kernel hands the lowest free fd to the replacement connection —
+        # so register() can raise KeyError on the reused fd. Evict the
+        # stale entry and retry rather than letting it kill the reactor.
+        buffers[conn] = bytearray()
+        try:
+            sel.register(conn, selectors.EVENT_READ)
+        except KeyError:
+            stale = sel.get_map().get(conn.fileno())
+            if stale is not None:
+                try:
+                    sel.unregister(stale.fileobj)
+                except (KeyError, OSError, ValueError):
+                    pass
+                buffers.pop(stale.fileobj, None)
+            sel.register(conn, selectors.EVENT_READ)
+
+    def _on_accept(self, s, sel, buffers):
+        try:
+            conn, addr = s.accept()
+        except OSError:
+            return
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sel_register(sel, conn, buffers)
+
+    def _on_readable(self, conn, sel, buffers):
+        try:
+            data = conn.recv(65536)
+        except Exception:
+            data = b''
+        if not data:
+            try:
+                sel.unregister(conn)
+            except (KeyError, ValueError):
+                pass
+            buffers.pop(conn, None)
+            conn.close()
+            return
+        buf = buffers[conn]
+        buf += data
+        try:
+            for payload in _drain_frames(buf):
+                self._handle_message(conn, payload)
+        except Exception:
+            # bad frame or broken connection — drop the peer, keep the reactor
+            try:
+                sel.unregister(conn)
+            except (KeyError, ValueError):
+                pass
+            buffers.pop(conn, None)
+            conn.close()
+
+    def _handle_message(self, conn, payload):
+        typ, ts, aux_ts, nid, aux_id = _unpack_msg(payload)
+        if typ == _T_REQUEST:
+            self._handle_request(conn, ts, nid)
+        elif typ == _T_RELEASE:
+            self._handle_release(ts, aux_ts, nid)
+        elif typ == _T_REPLY:
+            self._handle_reply(ts, aux_ts, nid, aux_id)
+        elif typ == _T_PING:
+            _send_framed(conn, _pack_msg(_T_PONG, 0, 0, self.my_id))
+        elif typ == _T_PONG:
+            self._handle_pong(nid)
+        # ACKs and unknown types carry no state — ignore them
+
+    def _handle_request(self, conn, ts, nid):
+        # update clock
+        self._increment_clock(ts)
+        # enqueue request, and piggyback our own outstanding request on the
+        # REPLY so the requester learns about it even if our REQUEST is
+        # still in flight on the other socket
+        with self.lock:
+            self._enqueue_request(ts, nid)
+            my_req = self._my_req
+        if my_req:
+            reply = _pack_msg(_T_REPLY, self._increment_clock(), my_req[0], self.my_id, my_req[1])
+        else:
+            reply = _pack_msg(_T_REPLY, self._increment_clock(), 0, self.my_id)
+        _send_framed(conn, reply)
+
+    def _handle_release(self, ts, req_ts, nid):
+        # update clock
+        self._increment_clock(ts)
+        # tombstone the released request; req_ts is the timestamp the
+        # request was queued under (not the RELEASE's clock).
+        # No ACK — RELEASE is one-way.
+        self._remove_request(nid, req_ts)
+
+    def _handle_reply(self, ts, pending_ts, nid, pending_id):
+        self._increment_clock(ts)
+        sent = self._req_sent.pop(nid, None)
+        if sent is not None:
+            self._rtt_ewma[nid] = 0.8 * self._rtt_ewma.get(nid, 0.01) + 0.2 * (time.time() - sent)
+        # mark reply received, queueing any piggybacked pending request
+        # (timestamps start at 1, so pending_ts == 0 means none)
+        with self.cv:
+            if pending_ts:
+                self._enqueue_request(pending_ts, pending_id)
+            self.replies_needed.discard(nid)
+            self.cv.notify_all()
+
+    def _handle_pong(self, nid):
+        sent = self._ping_sent.pop(nid, None)
+        if sent is not None:
+            self._rtt_ewma[nid] = 0.8 * self._rtt_ewma.get(nid, 0.01) + 0.2 * (time.time() - sent)
+        with self.cv:
+            self._pong_seen.add(nid)
+            self.cv.notify_all()
+
+    def _enqueue_request(self, ts, nid):
+        # Caller must hold self.lock. Skips pairs we have already queued
+        # (piggybacked copy of a direct REQUEST) or already released.
+        pair = (ts, nid)
+        if pair in self._queued or ts <= self._last_removed.get(nid, -1):
+            return
+        self._queued.add(pair)
+        heapq.heappush(self._heap, pair)
+        self._refresh_head()
+
+    def _remove_request(self, nid, ts):
+        # O(1) lazy removal: tombstone the pair instead of rebuilding the heap
+        with self.cv:
+            self._removed.add((ts, nid))
+            if ts > self._last_removed.get(nid, -1):
+                self._last_removed[nid] = ts
+            self._refresh_head()
+            live = sorted(set(self._heap) - self._removed)
+            # the queue head may have changed — wake any waiting acquirer
+            self.cv.notify_all()
+        print(f"[DME] Queue after removing {nid}: {live}")
+
+    def _refresh_head(self):
+        # Caller must hold self.lock. Pops tombstoned entries off the heap
+        # and publishes the live head as a fresh tuple reference.
+        while self._heap and self._heap[0] in self._removed:
+            pair = heapq.heappop(self._heap)
+            self._removed.discard(pair)
+            self._queued.discard(pair)
+        self._head_cache = self._heap[0] if self._heap else None
+
+    def _peek_head(self):
+        # The cache is maintained by every writer, so reading it is just a
+        # reference load — safe even without self.lock.
+        return self._head_cache
+
+    def _drop_peer_conn(self, pid):
+        s = self.peer_conns[pid]
+        if s is not None:
+            try:
+                s.close()
+            except Exception:
+                pass
+            self.peer_conns[pid] = None
+
+    def _send_to_peer(self, peer, msg, timeout=5, quiet=False):
+        # One-way write on the persistent connection. Responses (REPLY,
+        # PONG) come back asynchronously through the reactor, which reads
+        # every outbound socket as well — no sender ever blocks in recv.
+        # quiet suppresses the failure print: probes retry every idle
+        # second while a peer is down, which would otherwise spam the
+        # prompt with one error line per tick.
+        pid = peer["id"]
+        with self.peer_locks[pid]:
+            retried = False
+            while True:
+                # a cached socket may be stale (peer restarted) — on failure
+                # drop it and retry once with a fresh connection
+                fresh = self.peer_conns[pid] is None
+                try:
+                    s = self.peer_conns[pid]
+                    if s is None:
+                        s = _mk_tcp_sock()
+                        s.settimeout(timeout)
+                        s.connect((peer["host"], peer["port"]))
+                        self.peer_conns[pid] = s
+                        self._register_outbound(s)
+                    _send_framed(s, msg)
+                    return True
+                except Exception as e:
+                    self._drop_peer_conn(pid)
+                    if fresh or retried:
+                        # network error or peer down; if peer is down then we treat as non-responsive
+                        if not quiet:
+                            print(f"[DME] Failed to contact peer {pid}: {e}")
+                        with self.cv:
+                            self.replies_needed.discard(pid)
+                            self.cv.notify_all()
+                        return False
+                    retried = True
+
+    def _probe_peer(self, peer):
+        pid = peer["id"]
+        deadline = time.time() + max(0.2, 3 * self._rtt_ewma.get(pid, 0.01))
+        with self.cv:
+            self._pong_seen.discard(pid)
+        self._ping_sent[pid] = time.time()
+        if not self._send_to_peer(peer, _pack_msg(_T_PING), timeout=0.5, quiet=True):
+            return False
+        # the PONG arrives through the reactor, which notifies the condition
+        with self.cv:
+            while pid not in self._pong_seen:
+                remaining = deadline - time.time()
+                if remaining <= 0 or not self.cv.wait(timeout=remaining):
+                    if pid in self._pong_seen:
+                        break
+                    return False
+            return True
+
+    def _declare_peer_dead(self, pid):
+        print(f"[DME] Peer {pid} is unresponsive — treating as down")
+        self._ping_fails[pid] = 0
+        with self.cv:
+            self.replies_needed.discard(pid)
+            # their queued requests would block everyone forever — drop them
+            for pair in list(self._queued):
+                if pair[1] == pid:
+                    self._removed.add(pair)
+                    if pair[0] > self._last_removed.get(pid, -1):
+                        self._last_removed[pid] = pair[0]
+            self._refresh_head()
+            self.cv.notify_all()
 
     def request_critical_section(self):
-        # increment local clock and create request timestamp
-        ts = self._increment_clock()
-        # enqueue own request
-        self.request_queue.put((ts, self.my_id))
-        # prepare set of peers required replies
-        self.replies_needed = set(p["id"] for p in self.peers)
-        # send REQUEST to all peers
-        req_msg = {"type":"REQUEST", "timestamp": ts, "node_id": self.my_id}
+        # Clock tick, queue insert and reply accounting are fused into one
+        # critical section: by the time the first REQUEST can be answered,
+        # our own request is queued, piggybacking is armed and
+        # replies_needed is fully populated — no REPLY can slip through a
+        # half-built state. (_increment_clock only takes the clock lock, so
+        # nesting it under self.lock cannot deadlock.)
+        with self.cv:
+            ts = self._increment_clock()
+            self._enqueue_request(ts, self.my_id)
+            self._my_req = (ts, self.my_id)
+            self.replies_needed = set(p["id"] for p in self.peers)
+        # send REQUEST to all peers; REPLYs flow back through the reactor,
+        # which updates replies_needed and notifies the condition
+        req_msg = _pack_msg(_T_REQUEST, ts, 0, self.my_id)
+        now = time.time()
         for p in self.peers:
-            # best-effort send; REPLY may come later
-            self._send_to_peer(p, req_msg, expect_response=True)
-        # Wait until all replies received and own request is at the head of queue
-        # Wait for replies_event
-        # But also check queue head
-        # Use a loop with timeout to avoid deadlock if a peer is down:
-        start = time.time()
+            self._req_sent[p["id"]] = now
+        list(self._bcast_pool.map(lambda p: self._send_to_peer(p, req_msg), self.peers))
+        # Fast path: the head cache and reply set are single reference
+        # loads, atomic in CPython, so when every REPLY beat us here entry
+        # costs no lock acquisition at all. A stale read just fails the
+        # check and falls through to the waiting path. Piggybacked pending
+        # requests are queued before their REPLY is accounted, so an empty
+        # replies_needed means every earlier request is already visible.
+        if not self.replies_needed and self._peek_head() == (ts, self.my_id):
+            return ts
+        # Wait until all replies received and own request is at the head of
+        # the queue. The condition is notified on every REPLY/RELEASE, so
+        # entry happens as soon as the predicate holds — no polling interval.
+        # The wait timeout adapts to observed peer RTTs; when it fires, the
+        # nodes we are stuck on are health-checked with a PING instead of
+        # everyone stalling behind a flat 10 s safety valve.
         while True:
-            # first: wait for replies (but don't block forever)
-            if not self.replies_event.is_set():
-                # short sleep wait
-                time.sleep(0.1)
-            # check if we have replies or peers are unreachable
-            with self.lock:
-                have_all_replies = (not self.replies_needed)
-            # check queue head
-            head_ok = False
-            if not self.request_queue.empty():
-                head_ts, head_id = self.request_queue.queue[0]
-                if head_id == self.my_id and head_ts == ts:
-                    head_ok = True
-            if have_all_replies and head_ok:
-                # Enter critical section
-                self.replies_event.clear()
-                return ts  # return timestamp used for this critical section
-            # safety: if waiting too long (e.g., peer down), assume peers that didn't reply are down
-            if time.time() - start > 10:
-                # We will proceed if we are first in queue among alive nodes. For demo simplicity,
-                # if some peers didn't reply we treat them as down after timeout.
-                # If someone else is ahead in queue but doesn't reply, risk exists but for lab this is okay.
-                with self.lock:
-                    if not self.request_queue.empty():
-                        head_ts, head_id = self.request_queue.queue[0]
-                        if head_id == self.my_id and head_ts == ts:
-                            self.replies_event.clear()
-                            return ts
-                # otherwise keep waiting a bit more
-                start = time.time()
-                print(f"[DME] Waiting for replies from: {self.replies_needed}")
-                print(f"[DME] Queue state: {list(self.request_queue.queue)}")
+            with self.cv:
+                timed_out = False
+                while not (not self.replies_needed and self._peek_head() == (ts, self.my_id)):
+                    wait = max(0.2, 3 * max(self._rtt_ewma.values(), default=0.01) + 0.05)
+                    if not self.cv.wait(timeout=wait):
+                        timed_out = True
+                        break
+                if not timed_out:
+                    # Enter critical section
+                    return ts  # return timestamp used for this critical section
+                # who are we stuck on? missing repliers, plus whoever owns
+                # the queue head (they may have died holding the CS)
+                suspects = set(self.replies_needed)
+                head = self._peek_head()
+                if head is not None and head[1] != self.my_id:
+                    suspects.add(head[1])
+            # probe outside the lock; two consecutive failures mean down
+            for p in self.peers:
+                pid = p["id"]
+                if pid not in suspects:
+                    continue
+                if self._probe_peer(p):
+                    self._ping_fails[pid] = 0
+                elif self._ping_fails.get(pid, 0) + 1 >= 2:
+                    self._declare_peer_dead(pid)
+                else:
+                    self._ping_fails[pid] = self._ping_fails.get(pid, 0) + 1
 
 
     def release_critical_section(self, ts):
-        # remove own request from queue
+        # remove own request from queue and stop piggybacking it
+        with self.cv:
+            self._my_req = None
         self._remove_request(self.my_id, ts)
         # increment clock and broadcast RELEASE
         rts = self._increment_clock()
-        rel_msg = {"type":"RELEASE", "timestamp": rts, "node_id": self.my_id}
+        rel_msg = _pack_msg(_T_RELEASE, rts, ts, self.my_id)
+        # fire-and-forget: nothing to wait for on the CS exit path
+        list(self._bcast_pool.map(
+            lambda p: self._send_to_peer(p, rel_msg), self.peers))
+
+    def tick(self):
+        # Idle-time housekeeping, driven by the CLI between commands.
+        # Probing a peer whose connection is down re-opens it lazily, so a
+        # restarted peer is reconnected (and its probe-failure count reset)
+        # before the next acquire needs it, instead of on the hot path.
         for p in self.peers:
-            self._send_to_peer(p, rel_msg, expect_response=True)
+            if self.peer_conns[p["id"]] is None and self._probe_peer(p):
+                self._ping_fails[p["id"]] = 0
 
     def stop(self):
         self.running = False
+        self._bcast_pool.shutdown(wait=False)